@@ -16,9 +16,11 @@ import pytest
 
 import os
 import pathlib
-import distutils.spawn
+import shutil
 
 MODULES_ARTIFACT_GEN_PATH = pathlib.Path(__file__).parent.parent.absolute()
+MENDER_ARTIFACT_PATH = shutil.which("mender-artifact")
+TMPFS_TEMPROOT = "/dev/shm"
 
 
 @pytest.fixture(scope="session")
@@ -26,11 +28,39 @@ def single_file_artifact_gen_path(request):
     return os.path.join(MODULES_ARTIFACT_GEN_PATH, "single-file-artifact-gen")
 
 
+@pytest.fixture(scope="session")
+def mender_artifact_path(request):
+    return MENDER_ARTIFACT_PATH
+
+
+@pytest.fixture(scope="session")
+def update_file(tmp_path_factory):
+    """The file to bundle in the single-file artifacts, shared by all tests"""
+    path = tmp_path_factory.mktemp("src") / "my-file"
+    path.write_text("my-content")
+    path.chmod(0o664)
+    return str(path)
+
+
 def pytest_configure(config):
     verify_sane_test_environment()
+    use_tmpfs_temproot(config)
 
 
 def verify_sane_test_environment():
     # check if required tools are in PATH, add any other checks here
-    if distutils.spawn.find_executable("mender-artifact") is None:
+    if MENDER_ARTIFACT_PATH is None:
         raise SystemExit("mender-artifact not found in PATH")
+
+
+def use_tmpfs_temproot(config):
+    # keep the temporary test files in RAM, unless another location was asked
+    # for. Without /dev/shm (e.g. on macOS) pytest keeps using the system
+    # temporary directory. Only the root is changed, so pytest still manages
+    # (and cleans up) numbered basetemp directories below it.
+    if config.option.basetemp or "PYTEST_DEBUG_TEMPROOT" in os.environ:
+        return
+    if os.path.isdir(TMPFS_TEMPROOT) and os.access(
+        TMPFS_TEMPROOT, os.W_OK | os.X_OK
+    ):
+        os.environ["PYTEST_DEBUG_TEMPROOT"] = TMPFS_TEMPROOT
@@ -14,190 +14,220 @@
 
 import pytest
 import os
+import pathlib
+import shlex
 import subprocess
-import tempfile
-import shutil
+import tarfile
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Generator arguments shared by all Test Cases without override_args
+BASE_ARGS = ("-n", "artifact-name", "-t", "device-type", "-d", "/dest/dir")
 
-class TestModulesArtifactGen:
-    @pytest.mark.parametrize(
-        "tc",
-        [
-            {"name": "basic case",},
-            {"name": "no arguments", "expect_fail": True, "override_args": " ",},
-            {
-                "name": "non existing",
-                "expect_fail": True,
-                "override_args": "-n artifact-name -t device-type -d /dest/dir non-existing-file",
-            },
-            {
-                "name": "missing artifact name",
-                "expect_fail": True,
-                "override_args": "-t device-type -d /dest/dir my-file",
-            },
-            {
-                "name": "missing device type",
-                "expect_fail": True,
-                "override_args": "-n artifact-name -d /dest/dir my-file",
-            },
-            {
-                "name": "missing dest dir",
-                "expect_fail": True,
-                "override_args": "-n artifact-name -t device-type my-file",
-            },
-            {
-                "name": "missing file",
-                "expect_fail": True,
-                "override_args": "-n artifact-name -t device-type -d /dest/dir",
-            },
-            {
-                "name": "add software-name",
-                "append_args": " --software-name custom",
-                "skip_output_asserts": True,
-                "extra_output_asserts": [
-                    """Provides:
+
+def build_argv(tc, artifact_file, update_file):
+    """Return the single-file-artifact-gen arguments for the given Test Case"""
+    if "override_args" in tc:
+        return tc["override_args"]
+    return (*BASE_ARGS, "-o", artifact_file, update_file, *tc.get("append_args", ()))
+
+
+# Expected in the `mender-artifact read` output unless skip_output_asserts is set
+DEFAULT_OUTPUT_ASSERTS = (
+    "Name: artifact-name",
+    "Compatible devices: '[device-type",
+    "Type:   single-file",
+    """Provides:
+	rootfs-image.single-file.version: artifact-name""",
+    """Files:
+      name:     dest_dir""",
+    "name:     filename",
+    "name:     permissions",
+    "name:     my-file",
+)
+
+SINGLE_FILE_TEST_CASES = [
+    {"name": "basic case",},
+    {"name": "no arguments", "expect_fail": True, "override_args": (),},
+    {
+        "name": "non existing",
+        "expect_fail": True,
+        "override_args": (*BASE_ARGS, "non-existing-file"),
+    },
+    {
+        "name": "missing artifact name",
+        "expect_fail": True,
+        "override_args": ("-t", "device-type", "-d", "/dest/dir", "my-file"),
+    },
+    {
+        "name": "missing device type",
+        "expect_fail": True,
+        "override_args": ("-n", "artifact-name", "-d", "/dest/dir", "my-file"),
+    },
+    {
+        "name": "missing dest dir",
+        "expect_fail": True,
+        "override_args": ("-n", "artifact-name", "-t", "device-type", "my-file"),
+    },
+    {
+        "name": "missing file",
+        "expect_fail": True,
+        "override_args": BASE_ARGS,
+    },
+    {
+        "name": "add software-name",
+        "append_args": ("--software-name", "custom"),
+        "skip_output_asserts": True,
+        "extra_output_asserts": [
+            """Provides:
 	rootfs-image.custom.version: artifact-name""",
-                ],
-            },
-            {
-                "name": "add software-version",
-                "append_args": " --software-version custom",
-                "skip_output_asserts": True,
-                "extra_output_asserts": [
-                    """Provides:
+        ],
+    },
+    {
+        "name": "add software-version",
+        "append_args": ("--software-version", "custom"),
+        "skip_output_asserts": True,
+        "extra_output_asserts": [
+            """Provides:
 	rootfs-image.single-file.version: custom""",
-                ],
-            },
-            {
-                "name": "add software-filesystem",
-                "append_args": " --software-filesystem custom",
-                "skip_output_asserts": True,
-                "extra_output_asserts": [
-                    """Provides:
+        ],
+    },
+    {
+        "name": "add software-filesystem",
+        "append_args": ("--software-filesystem", "custom"),
+        "skip_output_asserts": True,
+        "extra_output_asserts": [
+            """Provides:
 	custom.single-file.version: artifact-name""",
-                ],
-            },
-            {
-                "name": "add all software",
-                "append_args": " --software-filesystem custom1 --software-name custom2 --software-version custom3",
-                "skip_output_asserts": True,
-                "extra_output_asserts": [
-                    """Provides:
+        ],
+    },
+    {
+        "name": "add all software",
+        "append_args": (
+            "--software-filesystem",
+            "custom1",
+            "--software-name",
+            "custom2",
+            "--software-version",
+            "custom3",
+        ),
+        "skip_output_asserts": True,
+        "extra_output_asserts": [
+            """Provides:
 	custom1.custom2.version: custom3""",
-                ],
-            },
-            {
-                "name": "extra device type",
-                "append_args": " -t other-device-type",
-                "extra_output_asserts": [
-                    "Compatible devices: '[device-type other-device-type]'",
-                ],
-            },
-            {
-                "name": "pass through arguments provides",
-                "append_args": " -- --provides some:other --provides thing:else --provides-group group-to-provide",
-                "extra_output_asserts": [
-                    """Provides:
+        ],
+    },
+    {
+        "name": "extra device type",
+        "append_args": ("-t", "other-device-type"),
+        "extra_output_asserts": [
+            "Compatible devices: '[device-type other-device-type]'",
+        ],
+    },
+    {
+        "name": "pass through arguments provides",
+        "append_args": (
+            "--",
+            "--provides",
+            "some:other",
+            "--provides",
+            "thing:else",
+            "--provides-group",
+            "group-to-provide",
+        ),
+        "extra_output_asserts": [
+            """Provides:
 	rootfs-image.single-file.version: artifact-name
 	some: other
 	thing: else""",
-                    "Provides group: group-to-provide",
-                ],
-            },
-            {
-                "name": "pass through arguments depends",
-                "append_args": " -- --depends some:other --depends thing:else --depends-groups group-to-depend",
-                "extra_output_asserts": [
-                    """Depends:
+            "Provides group: group-to-provide",
+        ],
+    },
+    {
+        "name": "pass through arguments depends",
+        "append_args": (
+            "--",
+            "--depends",
+            "some:other",
+            "--depends",
+            "thing:else",
+            "--depends-groups",
+            "group-to-depend",
+        ),
+        "extra_output_asserts": [
+            """Depends:
 	some: other
 	thing: else""",
-                    "Depends on one of group(s): [group-to-depend]",
-                ],
-            },
-            {
-                "name": "pass through invalid arguments",
-                "expect_fail": True,
-                "append_args": " -- --invalid-flag",
-            },
+            "Depends on one of group(s): [group-to-depend]",
         ],
-    )
-    def test_single_file_update_module_gen(self, single_file_artifact_gen_path, tc):
+    },
+    {
+        "name": "pass through invalid arguments",
+        "expect_fail": True,
+        "append_args": ("--", "--invalid-flag"),
+    },
+]
+
+
+@pytest.fixture(params=SINGLE_FILE_TEST_CASES, ids=lambda tc: tc["name"])
+def tc(request):
+    return request.param
+
+
+class TestModulesArtifactGen:
+    def test_single_file_update_module_gen(
+        self,
+        single_file_artifact_gen_path,
+        mender_artifact_path,
+        update_file,
+        tmp_path,
+        tc,
+    ):
         """Test the single-file update module generator"""
 
-        file_tree = tempfile.mkdtemp()
-        try:
-            update_file = os.path.join(file_tree, "my-file")
-            with open(update_file, "w") as fd:
-                fd.write("my-content")
-            os.chmod(update_file, 0o664)
-
-            artifact_file = os.path.join(file_tree, "my-artifact.mender")
-
-            # Prepare comand args depending of the Test Case
-            cmd_args = " -o %s -n artifact-name -t device-type -d /dest/dir %s" % (
-                artifact_file,
-                update_file,
-            )
-            if "append_args" in tc:
-                cmd_args += tc["append_args"]
-            if "override_args" in tc and tc["override_args"]:
-                cmd_args = tc["override_args"]
-
-            # Execute the command
-            cmd = single_file_artifact_gen_path + cmd_args
-            logger.info("Executing: %s ", cmd)
-            if "expect_fail" in tc and tc["expect_fail"]:
-                with pytest.raises(subprocess.CalledProcessError):
-                    subprocess.check_call(cmd, shell=True)
-                return
-            else:
-                subprocess.check_call(cmd, shell=True)
-
-            # Read back with mender-artifact
-            cmd = "mender-artifact read %s" % artifact_file
-            logger.info("Executing: %s ", cmd)
-            output = subprocess.check_output(cmd, shell=True).decode().strip()
-
-            # Check output
-            if not "skip_output_asserts" in tc or not tc["skip_output_asserts"]:
-                assert "Name: artifact-name" in output, output
-                assert "Compatible devices: '[device-type" in output, output
-                assert "Type:   single-file" in output, output
-                assert (
-                    """Provides:
-	rootfs-image.single-file.version: artifact-name"""
-                    in output
-                ), output
-                assert (
-                    """Files:
-      name:     dest_dir"""
-                    in output
-                ), output
-                assert "name:     filename" in output, output
-                assert "name:     permissions" in output, output
-                assert "name:     my-file" in output, output
-            if "extra_output_asserts" in tc:
-                for output_assert in tc["extra_output_asserts"]:
-                    assert output_assert in output, output
-
-            # Check file contents
-            cmd = "tar -C %s -xf %s data/0000.tar.gz" % (file_tree, artifact_file)
-            logger.info("Executing: %s ", cmd)
-            subprocess.check_call(cmd, shell=True)
-            cmd = "tar -C %s -xzf %s/data/0000.tar.gz" % (file_tree, file_tree)
-            logger.info("Executing: %s ", cmd)
-            subprocess.check_call(cmd, shell=True)
-            with open(os.path.join(file_tree, "dest_dir")) as fd:
-                assert "/dest/dir" == fd.read().strip()
-            with open(os.path.join(file_tree, "filename")) as fd:
-                assert "my-file" == fd.read().strip()
-            with open(os.path.join(file_tree, "permissions")) as fd:
-                assert "664" == fd.read().strip()
-            with open(os.path.join(file_tree, "my-file")) as fd:
-                assert "my-content" == fd.read().strip()
-
-        finally:
-            shutil.rmtree(file_tree)
+        file_tree = str(tmp_path)
+        artifact_file = os.path.join(file_tree, "my-artifact.mender")
+
+        # Execute the command
+        cmd_args = build_argv(tc, artifact_file, update_file)
+        cmd = [single_file_artifact_gen_path, *cmd_args]
+        logger.info("Executing: %s ", shlex.join(cmd))
+        if "expect_fail" in tc and tc["expect_fail"]:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            assert result.returncode != 0, result.stdout + result.stderr
+            return
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+
+        # Read back with mender-artifact
+        cmd = [mender_artifact_path, "read", artifact_file]
+        logger.info("Executing: %s ", shlex.join(cmd))
+        output = subprocess.run(
+            cmd,
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=65536,
+        ).stdout.strip()
+
+        # Check output
+        if not "skip_output_asserts" in tc or not tc["skip_output_asserts"]:
+            missing = [e for e in DEFAULT_OUTPUT_ASSERTS if e not in output]
+            assert not missing, "%s not found in:\n%s" % (missing, output)
+        if "extra_output_asserts" in tc:
+            for output_assert in tc["extra_output_asserts"]:
+                assert output_assert in output, output
+
+        # Check file contents
+        with tarfile.open(artifact_file) as outer:
+            with outer.extractfile("data/0000.tar.gz") as payload:
+                with tarfile.open(fileobj=payload, mode="r:gz") as inner:
+                    inner.extractall(path=file_tree, filter="data")
+        for name, expected in [
+            ("dest_dir", "/dest/dir"),
+            ("filename", "my-file"),
+            ("permissions", "664"),
+            ("my-file", "my-content"),
+        ]:
+            assert expected == pathlib.Path(file_tree, name).read_text().strip()